@@ -1,63 +1,7 @@
+import asyncio
 import autogen
-import subprocess
-import xml.etree.ElementTree as ET
-from pathlib import Path
-import os
 
-class JavaProjectManager:
-    def __init__(self, project_root):
-        self.project_root = Path(project_root)
-        self.src_dir = self.project_root / "src" / "main" / "java"
-        self.test_dir = self.project_root / "src" / "test" / "java"
-        self.pom_path = self.project_root / "pom.xml"
-
-    def update_pom_dependencies(self, dependencies):
-        """Update pom.xml with new dependencies"""
-        if not self.pom_path.exists():
-            raise FileNotFoundError("pom.xml not found in the project root")
-
-        tree = ET.parse(self.pom_path)
-        root = tree.getroot()
-        
-        # Find or create dependencies section
-        deps = root.find("{http://maven.apache.org/POM/4.0.0}dependencies")
-        if deps is None:
-            deps = ET.SubElement(root, "dependencies")
-
-        # Add new dependencies
-        for dep in dependencies:
-            new_dep = ET.SubElement(deps, "dependency")
-            ET.SubElement(new_dep, "groupId").text = dep["groupId"]
-            ET.SubElement(new_dep, "artifactId").text = dep["artifactId"]
-            ET.SubElement(new_dep, "version").text = dep["version"]
-
-        tree.write(self.pom_path, encoding="utf-8", xml_declaration=True)
-
-    def compile_project(self):
-        """Compile the Java project using Maven"""
-        try:
-            result = subprocess.run(
-                ["mvn", "compile"],
-                cwd=self.project_root,
-                capture_output=True,
-                text=True
-            )
-            return result.returncode == 0, result.stdout
-        except Exception as e:
-            return False, str(e)
-
-    def run_tests(self):
-        """Run project tests using Maven"""
-        try:
-            result = subprocess.run(
-                ["mvn", "test"],
-                cwd=self.project_root,
-                capture_output=True,
-                text=True
-            )
-            return result.returncode == 0, result.stdout
-        except Exception as e:
-            return False, str(e)
+from java_project_manager import get_project_manager
 
 # Configure AutoGen agents
 config_list = [
@@ -88,16 +32,9 @@ user_proxy = autogen.UserProxyAgent(
 )
 
 # Create project manager instance
-project_manager = JavaProjectManager("./")
-
-def main():
-    # Example conversation to generate Java code and tests
-    user_proxy.initiate_chat(
-        java_assistant,
-        message="""Please create a simple Java class called Calculator with basic arithmetic 
-        operations and corresponding unit tests."""
-    )
+project_manager = get_project_manager("./")
 
+async def main():
     # Example dependencies to add to pom.xml
     dependencies = [
         {
@@ -112,27 +49,42 @@ def main():
         }
     ]
 
-    # Update pom.xml with required dependencies
-    try:
-        project_manager.update_pom_dependencies(dependencies)
+    # The conversation and the pom.xml update are independent, so run them side by side
+    chat_result, pom_result = await asyncio.gather(
+        asyncio.to_thread(
+            user_proxy.initiate_chat,
+            java_assistant,
+            message="""Please create a simple Java class called Calculator with basic arithmetic 
+        operations and corresponding unit tests."""
+        ),
+        asyncio.to_thread(project_manager.update_pom_dependencies, dependencies),
+        return_exceptions=True
+    )
+    if isinstance(chat_result, Exception):
+        raise chat_result
+
+    if isinstance(pom_result, Exception):
+        print(f"Error updating pom.xml: {pom_result}")
+    else:
         print("Successfully updated pom.xml with dependencies")
-    except Exception as e:
-        print(f"Error updating pom.xml: {e}")
+
+    # Write all pom.xml edits once, before Maven reads the file
+    project_manager.flush_pom()
 
     # Compile the project
-    success, output = project_manager.compile_project()
+    success, output = await project_manager.compile_project()
     if success:
         print("Project compiled successfully")
     else:
         print(f"Compilation failed: {output}")
 
     # Run tests
-    success, output = project_manager.run_tests()
+    success, output = await project_manager.run_tests()
     if success:
         print("All tests passed successfully")
     else:
         print(f"Tests failed: {output}")
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
 